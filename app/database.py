@@ -1,5 +1,5 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
@@ -33,6 +33,52 @@ def get_db():
         db.close()
 
 
+# Columns added to existing tables after their first release. create_all()
+# only creates missing tables, so these are added in place on startup.
+ADDED_COLUMNS = {
+    "transactions": [
+        "parser_name",
+        "parser_version",
+        "reparse_failed_signature",
+        "updated_at",
+    ],
+}
+
+
+def add_missing_columns():
+    """Add any ADDED_COLUMNS that an existing table doesn't have yet"""
+    inspector = inspect(engine)
+
+    with engine.begin() as conn:
+        for table_name, column_names in ADDED_COLUMNS.items():
+            if not inspector.has_table(table_name):
+                continue
+
+            table = Base.metadata.tables[table_name]
+            existing = {col["name"] for col in inspector.get_columns(table_name)}
+
+            for column_name in column_names:
+                column = table.columns[column_name]
+                if column_name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(
+                        text(
+                            f"ALTER TABLE {table_name} "
+                            f"ADD COLUMN {column_name} {column_type}"
+                        )
+                    )
+
+                if column.index:
+                    conn.execute(
+                        text(
+                            f"CREATE INDEX IF NOT EXISTS "
+                            f"ix_{table_name}_{column_name} "
+                            f"ON {table_name} ({column_name})"
+                        )
+                    )
+
+
 def init_db():
     """Initialize tables on startup"""
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    Base.metadata.create_all(bind=engine)
+    add_missing_columns()
\ No newline at end of file
@@ -1,9 +1,9 @@
-from fastapi import FastAPI, UploadFile, File, Depends
+from fastapi import FastAPI, UploadFile, File, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 from app.database import get_db, init_db
 from app.services.transaction_service import TransactionService
-from app.schemas import UploadResponse
+from app.schemas import ReparseResponse, UploadResponse
 import logging
 import re
 
@@ -156,6 +156,27 @@ async def upload_transactions(
         )
 
 
+@app.post("/reparse", response_model=ReparseResponse)
+def reparse_transactions(
+    batch_size: int = Query(500, ge=1, le=5000),
+    db: Session = Depends(get_db),
+):
+    """
+    Re-run the parsers on transactions stored by an older parser version and
+    on quarantined messages, updating them in place.
+    """
+    service = TransactionService(db)
+    stats = service.reparse(batch_size=batch_size)
+
+    logger.info(
+        f"Reparse done: {stats['transactions_updated']} transactions "
+        f"updated, {stats['quarantined_recovered']} quarantined messages "
+        f"recovered, {len(stats['errors'])} errors"
+    )
+
+    return ReparseResponse(**stats)
+
+
 @app.get("/health")
 def health_check():
     return {"status": "healthy"}
\ No newline at end of file
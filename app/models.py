@@ -42,6 +42,30 @@ class Transaction(Base):
     source_account = Column(String(20), nullable=True)
     destination_account = Column(String(20), nullable=True)
     fees = Column(Float, nullable=True, default=0)
+    parser_name = Column(String(50), nullable=True, index=True)
+    parser_version = Column(Integer, nullable=True)
+    # Parser signature a reparse last failed with, so the row isn't retried
+    # until a parser changes again
+    reparse_failed_signature = Column(String(255), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
-    vendor = relationship("Vendor", back_populates="transactions")
\ No newline at end of file
+    vendor = relationship("Vendor", back_populates="transactions")
+
+
+class FailedMessage(Base):
+    """Quarantine for messages that no parser could handle"""
+
+    __tablename__ = "failed_messages"
+
+    id = Column(Integer, primary_key=True, index=True)
+    raw_message = Column(Text, nullable=False)
+    # sha256 of raw_message, for indexed lookups
+    message_hash = Column(String(64), unique=True, index=True, nullable=False)
+    error = Column(String(255), nullable=True)
+    # Parser names/versions that were tried, e.g. "AlRajhiParser:1,SNBParser:1"
+    parser_signature = Column(String(255), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_attempted_at = Column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
\ No newline at end of file
@@ -5,6 +5,7 @@ import re
 
 class AlRajhiParser(BaseParser):
     BANK_NAME = "AL_RAJHI"
+    PARSER_VERSION = 1
 
     TRANSACTION_TYPES = {
         "شراء": "purchase",
@@ -5,6 +5,15 @@ from datetime import datetime
 
 
 class BaseParser(ABC):
+    # Bump whenever a change to the parsing rules could alter the output for
+    # messages that were already stored, so they get picked up by a reparse.
+    PARSER_VERSION = 1
+
+    @property
+    def name(self) -> str:
+        """Stable identifier stored alongside each parsed transaction"""
+        return type(self).__name__
+
     @abstractmethod
     def can_parse(self, message: str) -> bool:
         """Check if this parser can handle the message"""
@@ -5,6 +5,7 @@ import re
 
 class SNBParser(BaseParser):
     BANK_NAME = "SNB"
+    PARSER_VERSION = 1
 
     def can_parse(self, message: str) -> bool:
         keywords = ["حوالة", "شراء", "رصيد"]
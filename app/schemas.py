@@ -25,6 +25,8 @@ class Transaction(TransactionBase):
     id: int
     raw_message: str
     vendor_id: Optional[int]
+    parser_name: Optional[str] = None
+    parser_version: Optional[int] = None
     created_at: datetime
 
     class Config:
@@ -51,4 +53,13 @@ class UploadResponse(BaseModel):
     parsed_successfully: int
     failed: int
     errors: list[dict]
-    created_vendors: list[str]
\ No newline at end of file
+    created_vendors: list[str]
+
+
+class ReparseResponse(BaseModel):
+    transactions_checked: int
+    transactions_updated: int
+    transactions_failed: int
+    quarantined_checked: int
+    quarantined_recovered: int
+    errors: list[dict]
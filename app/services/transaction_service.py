@@ -1,17 +1,39 @@
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
 from app import models, schemas
 from app.parsers.alrajhi import AlRajhiParser
+from app.parsers.base import BaseParser
 from app.parsers.snb import SNBParser
 from typing import Optional
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 class TransactionService:
+    # Parser output fields that map to non-nullable Transaction columns
+    REQUIRED_FIELDS = [
+        "raw_message",
+        "amount",
+        "currency",
+        "datetime",
+        "transaction_type",
+        "bank",
+    ]
+
     def __init__(self, db: Session):
         self.db = db
         self.parsers = [AlRajhiParser(), SNBParser()]
 
-    def get_or_create_vendor(self, vendor_name: str) -> Optional[int]:
-        """Get existing vendor or create new one"""
+    def get_or_create_vendor(
+        self, vendor_name: str, commit: bool = True
+    ) -> Optional[int]:
+        """
+        Get existing vendor or create new one.
+        With commit=False the new vendor is only flushed, leaving the
+        commit to the caller.
+        """
         if not vendor_name:
             return None
 
@@ -24,54 +46,293 @@ class TransactionService:
         if not vendor:
             vendor = models.Vendor(raw_vendor_name=vendor_name)
             self.db.add(vendor)
-            self.db.commit()
-            self.db.refresh(vendor)
+            if commit:
+                self.db.commit()
+                self.db.refresh(vendor)
+            else:
+                self.db.flush()
 
         return vendor.id
 
+    @property
+    def parser_signature(self) -> str:
+        """Names and versions of all parsers, used to tag quarantined messages"""
+        return ",".join(
+            f"{parser.name}:{parser.PARSER_VERSION}" for parser in self.parsers
+        )
+
+    def parse_message(
+        self, message: str
+    ) -> tuple[Optional[BaseParser], Optional[dict], Optional[str]]:
+        """
+        Return the first parser that handles the message and its output,
+        or an error when no parser produced a complete transaction
+        """
+        error = "No parser matched"
+
+        for parser in self.parsers:
+            if parser.can_parse(message):
+                parsed_data = parser.parse(message)
+                if not parsed_data:
+                    continue
+
+                missing = [
+                    field
+                    for field in self.REQUIRED_FIELDS
+                    if parsed_data.get(field) is None
+                ]
+                if missing:
+                    error = f"{parser.name} missing: {', '.join(missing)}"
+                    continue
+
+                return parser, parsed_data, None
+
+        return None, None, error
+
+    def apply_parsed_data(
+        self,
+        transaction: models.Transaction,
+        parser: BaseParser,
+        parsed_data: dict,
+        commit: bool = True,
+    ) -> None:
+        """Copy parser output onto a new or existing transaction"""
+        vendor_id = None
+        if parsed_data.get("vendor_name"):
+            vendor_id = self.get_or_create_vendor(
+                parsed_data["vendor_name"], commit=commit
+            )
+
+        transaction.raw_message = parsed_data["raw_message"]
+        transaction.amount = parsed_data["amount"]
+        transaction.currency = parsed_data["currency"]
+        transaction.card_last4 = parsed_data.get("card_last4")
+        transaction.vendor_id = vendor_id
+        transaction.datetime = parsed_data["datetime"]
+        transaction.transaction_type = parsed_data["transaction_type"]
+        transaction.direction = parsed_data.get("direction")
+        transaction.bank = parsed_data["bank"]
+        transaction.source_account = parsed_data.get("source_account")
+        transaction.destination_account = parsed_data.get("destination_account")
+        transaction.fees = parsed_data.get("fees", 0)
+        transaction.parser_name = parser.name
+        transaction.parser_version = parser.PARSER_VERSION
+        transaction.reparse_failed_signature = None
+
+    @staticmethod
+    def message_hash(message: str) -> str:
+        """Key used to look up quarantined messages"""
+        return hashlib.sha256(message.encode("utf-8")).hexdigest()
+
+    def get_quarantined(self, message: str) -> Optional[models.FailedMessage]:
+        """Find the quarantined copy of a message, if any"""
+        return (
+            self.db.query(models.FailedMessage)
+            .filter(
+                models.FailedMessage.message_hash == self.message_hash(message)
+            )
+            .first()
+        )
+
+    def quarantine_message(self, message: str, error: str) -> None:
+        """Keep an unparsed message so it can be retried after a parser fix"""
+        failed = self.get_quarantined(message)
+
+        if not failed:
+            failed = models.FailedMessage(
+                raw_message=message, message_hash=self.message_hash(message)
+            )
+            self.db.add(failed)
+
+        failed.error = error
+        failed.parser_signature = self.parser_signature
+        self.db.commit()
+
     def parse_and_save_message(self, message: str) -> dict:
         """Parse a single message and save to DB"""
         message = message.strip()
         if not message:
             return {"success": False, "error": "Empty message"}
 
-        # Try each parser
+        parser, parsed_data, error = self.parse_message(message)
+
+        if not parsed_data:
+            self.quarantine_message(message, error)
+            return {
+                "success": False,
+                "error": error,
+                "message": message,
+            }
+
+        transaction = models.Transaction()
+        self.apply_parsed_data(transaction, parser, parsed_data)
+
+        self.db.add(transaction)
+
+        # Drop a quarantined copy so a later reparse doesn't insert it twice
+        failed = self.get_quarantined(message)
+        if failed:
+            self.db.delete(failed)
+
+        self.db.commit()
+
+        return {
+            "success": True,
+            "vendor_name": parsed_data.get("vendor_name"),
+        }
+
+    def _stale_transactions_filter(self, signature: str):
+        """
+        Rows produced by an older parser version, or before versioning,
+        that haven't already failed a reparse against the current parsers
+        """
+        conditions = [models.Transaction.parser_name.is_(None)]
+        known_names = []
+
         for parser in self.parsers:
-            if parser.can_parse(message):
-                parsed_data = parser.parse(message)
+            known_names.append(parser.name)
+            conditions.append(
+                and_(
+                    models.Transaction.parser_name == parser.name,
+                    or_(
+                        models.Transaction.parser_version.is_(None),
+                        models.Transaction.parser_version
+                        != parser.PARSER_VERSION,
+                    ),
+                )
+            )
 
-                if parsed_data:
-                    # Get or create vendor
-                    vendor_id = None
-                    if parsed_data.get("vendor_name"):
-                        vendor_id = self.get_or_create_vendor(
-                            parsed_data["vendor_name"]
-                        )
-
-                    # Create transaction
-                    transaction = models.Transaction(
-                        raw_message=parsed_data["raw_message"],
-                        amount=parsed_data["amount"],
-                        currency=parsed_data["currency"],
-                        card_last4=parsed_data.get("card_last4"),
-                        vendor_id=vendor_id,
-                        datetime=parsed_data["datetime"],
-                        transaction_type=parsed_data["transaction_type"],
-                        direction=parsed_data.get("direction"),
-                        bank=parsed_data["bank"],
-                        source_account=parsed_data.get("source_account"),
-                        destination_account=parsed_data.get(
-                            "destination_account"
-                        ),
-                        fees=parsed_data.get("fees", 0),
-                    )
-
-                    self.db.add(transaction)
-                    self.db.commit()
+        # Parsers that were removed or renamed
+        conditions.append(models.Transaction.parser_name.notin_(known_names))
+        return and_(
+            or_(*conditions),
+            or_(
+                models.Transaction.reparse_failed_signature.is_(None),
+                models.Transaction.reparse_failed_signature != signature,
+            ),
+        )
+
+    def _iter_batches(self, query, model, batch_size: int):
+        """
+        Stream rows in id order without holding a cursor across commits.
+        Each batch is locked until the caller commits; rows locked by a
+        concurrent reparse are skipped so they aren't processed twice.
+        """
+        last_id = 0
+        while True:
+            batch = (
+                query.filter(model.id > last_id)
+                .order_by(model.id)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            if not batch:
+                return
+
+            yield batch
+            last_id = batch[-1].id
+
+    @staticmethod
+    def _new_reparse_stats() -> dict:
+        return {
+            "transactions_checked": 0,
+            "transactions_updated": 0,
+            "transactions_failed": 0,
+            "quarantined_checked": 0,
+            "quarantined_recovered": 0,
+            "errors": [],
+        }
 
-                    return {
-                        "success": True,
-                        "vendor_name": parsed_data.get("vendor_name"),
+    @staticmethod
+    def _merge_reparse_stats(stats: dict, batch_stats: dict) -> None:
+        for key, value in batch_stats.items():
+            stats[key] += value
+
+    def _reparse_transactions(self, batch, signature: str, stats: dict) -> None:
+        """Re-run the parsers on a batch of stale transactions"""
+        for transaction in batch:
+            stats["transactions_checked"] += 1
+            parser, parsed_data, error = self.parse_message(
+                transaction.raw_message
+            )
+
+            if parsed_data:
+                self.apply_parsed_data(
+                    transaction, parser, parsed_data, commit=False
+                )
+                stats["transactions_updated"] += 1
+            else:
+                # Keep the existing fields rather than dropping user data
+                transaction.reparse_failed_signature = signature
+                stats["transactions_failed"] += 1
+                stats["errors"].append(
+                    {
+                        "transaction_id": transaction.id,
+                        "message": transaction.raw_message[:100],
+                        "error": error,
+                    }
+                )
+
+    def _reparse_quarantined(self, batch, signature: str, stats: dict) -> None:
+        """Re-run the parsers on a batch of quarantined messages"""
+        for failed in batch:
+            stats["quarantined_checked"] += 1
+            parser, parsed_data, error = self.parse_message(failed.raw_message)
+
+            if parsed_data:
+                transaction = models.Transaction()
+                self.apply_parsed_data(
+                    transaction, parser, parsed_data, commit=False
+                )
+                self.db.add(transaction)
+                self.db.delete(failed)
+                stats["quarantined_recovered"] += 1
+            else:
+                failed.error = error
+                failed.parser_signature = signature
+                stats["errors"].append(
+                    {
+                        "quarantine_id": failed.id,
+                        "message": failed.raw_message[:100],
+                        "error": error,
                     }
+                )
+
+    def reparse(self, batch_size: int = 500) -> dict:
+        """
+        Re-run parsers only on stored transactions whose parser version is
+        outdated and on quarantined messages tried with older parsers.
+        Transactions are updated in place, recovered messages leave quarantine.
+        Rows that still don't parse are listed in "errors". Counts only cover
+        committed batches; if a batch fails, the run stops and the error is
+        reported alongside what was already done.
+        """
+        stats = self._new_reparse_stats()
+        signature = self.parser_signature
+
+        stale_transactions = self.db.query(models.Transaction).filter(
+            self._stale_transactions_filter(signature)
+        )
+        stale_quarantine = self.db.query(models.FailedMessage).filter(
+            models.FailedMessage.parser_signature != signature
+        )
+        jobs = [
+            (stale_transactions, models.Transaction, self._reparse_transactions),
+            (stale_quarantine, models.FailedMessage, self._reparse_quarantined),
+        ]
+
+        try:
+            for query, model, reparse_batch in jobs:
+                for batch in self._iter_batches(query, model, batch_size):
+                    batch_stats = self._new_reparse_stats()
+                    reparse_batch(batch, signature, batch_stats)
+                    self.db.commit()
+                    self._merge_reparse_stats(stats, batch_stats)
+
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Reparse error: {str(e)}", exc_info=True)
+            stats["errors"].append({"error": f"Server error: {str(e)}"})
 
-        return {"success": False, "error": "No parser matched", "message": message}
\ No newline at end of file
+        return stats